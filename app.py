@@ -1,26 +1,21 @@
-from flask import Flask, request, jsonify
-from firebase_service import get_user_heart_data, update_calories_tracking
-from model_service import predict_warning
+from flask import Flask, Response, request
+from firebase_service import get_user_heart_data, update_calories_tracking, get_model_routing, register_model_version, set_active_model_routing, set_shadow_model_routing
+from model_service import predict_warning, deploy_model_async, apply_model_routing_async, start_model_sync, unload_model, get_model_registry_status, parse_sample_rate
 from auth_service import register_user, login_user, refresh_auth_token, logout_user, get_user_profile, update_user_profile
-from auth_middleware import token_required
+from auth_middleware import token_required, admin_required
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
+from rate_limiter import rate_limited, render_metrics
+from responses import success_response, error_response
 import os
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+# Cloud Run sits behind one proxy; trust its X-Forwarded-For so remote_addr is the client IP
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
 
-# Hàm tiện ích để chuẩn hóa response
-def success_response(data, status_code=200):
-    return jsonify({
-        'statusCode': status_code,
-        'data': data
-    }), status_code
-
-def error_response(error_message, status_code=400):
-    return jsonify({
-        'statusCode': status_code,
-        'errorString': error_message
-    }), status_code
+# Keep this instance's model in line with the fleet-wide routing
+start_model_sync(get_model_routing)
 
 # Authentication routes
 @app.route('/auth/register', methods=['POST'])
@@ -150,6 +145,7 @@ def update_profile(user_id):
 
 @app.route('/realtime-heart', methods=['GET'])
 @token_required
+@rate_limited('realtime-heart', inference=True)
 def get_realtime_heart(user_id):
     # User ID is now obtained from the token
     
@@ -193,6 +189,7 @@ def get_realtime_heart(user_id):
 
 # Public endpoint (for anonymous users)
 @app.route('/public/heart-data', methods=['GET'])
+@rate_limited('public-heart-data', inference=True)
 def get_public_heart_data():
     # Gets anonymous user data
     data = get_user_heart_data('anonymous')
@@ -228,6 +225,7 @@ def get_public_heart_data():
 
 @app.route('/calories', methods=['GET'])
 @token_required
+@rate_limited('calories')
 def calculate_calories(user_id):
     heart_data = get_user_heart_data(user_id)
     if not heart_data:
@@ -286,6 +284,141 @@ def calculate_calories(user_id):
     
     return success_response(response_data, 200)
 
+@app.route('/metrics', methods=['GET'])
+@admin_required
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+# Model registry admin routes
+# Routing is stored in the database and every instance converges on it within
+# MODEL_SYNC_INTERVAL seconds; the instance handling the request applies it at once
+def _invalid_version(version):
+    # Versions appear in /admin/models/<version> URLs and as database keys,
+    # and a null version means "no shadow model"
+    if not isinstance(version, str) or not version.strip():
+        return True
+    return any(c in version for c in '/.$#[]')
+
+@app.route('/admin/models', methods=['GET'])
+@admin_required
+def get_models():
+    status = get_model_registry_status()
+    status['fleet_routing'] = get_model_routing()
+    return success_response(status, 200)
+
+@app.route('/admin/models', methods=['POST'])
+@admin_required
+def deploy_model_version():
+    data = request.get_json()
+
+    # Validate required fields
+    if not data or not all(k in data for k in ('version', 'path')):
+        return error_response('Missing required fields', 400)
+
+    version = data['version']
+    if _invalid_version(version):
+        return error_response('version must be a non-empty string without / . $ # [ ]', 400)
+    if not isinstance(data['path'], str) or not data['path'].strip():
+        return error_response('path must be a non-empty string', 400)
+
+    activate = data.get('activate', True)
+    if not isinstance(activate, bool):
+        return error_response('activate must be true or false', 400)
+
+    shadow_sample_rate = data.get('shadow_sample_rate')
+    if shadow_sample_rate is not None:
+        shadow_sample_rate = parse_sample_rate(shadow_sample_rate)
+        if shadow_sample_rate is None:
+            return error_response('shadow_sample_rate must be a number between 0 and 1', 400)
+
+    register_model_version(version, data['path'])
+    if activate:
+        set_active_model_routing(version, data['path'])
+        # A version can't shadow itself
+        if (get_model_routing().get('shadow') or {}).get('version') == version:
+            set_shadow_model_routing(None)
+    elif shadow_sample_rate is not None:
+        set_shadow_model_routing(version, data['path'], shadow_sample_rate)
+
+    # Load in the background; the current model keeps serving until the swap
+    deploy_model_async(
+        version,
+        data['path'],
+        activate=activate,
+        shadow_sample_rate=shadow_sample_rate
+    )
+
+    return success_response({
+        'message': f"Loading model {version}",
+        'version': version
+    }, 202)
+
+@app.route('/admin/models/<version>/activate', methods=['POST'])
+@admin_required
+def activate_model_version(version):
+    routing = get_model_routing()
+    registered = routing.get('versions', {}).get(version)
+    if not registered:
+        return error_response(f"Model {version} is not registered", 404)
+
+    set_active_model_routing(version, registered['path'])
+    # A version can't shadow itself
+    if (routing.get('shadow') or {}).get('version') == version:
+        set_shadow_model_routing(None)
+
+    apply_model_routing_async(get_model_routing())
+    return success_response({
+        'message': f"Activating model {version}",
+        'version': version
+    }, 202)
+
+@app.route('/admin/models/shadow', methods=['PUT'])
+@admin_required
+def update_shadow_model():
+    data = request.get_json() or {}
+
+    sample_rate = parse_sample_rate(data.get('sample_rate', 0.0))
+    if sample_rate is None:
+        return error_response('sample_rate must be a number between 0 and 1', 400)
+
+    # A null version disables shadow scoring
+    version = data.get('version')
+    if version is None:
+        set_shadow_model_routing(None)
+    else:
+        if _invalid_version(version):
+            return error_response('version must be a non-empty string without / . $ # [ ]', 400)
+        routing = get_model_routing()
+        registered = routing.get('versions', {}).get(version)
+        if not registered:
+            return error_response(f"Model {version} is not registered", 404)
+        if (routing.get('active') or {}).get('version') == version:
+            return error_response('Active model cannot be its own shadow', 400)
+        set_shadow_model_routing(version, registered['path'], sample_rate)
+
+    apply_model_routing_async(get_model_routing())
+    return success_response({
+        'message': 'Shadow model updated',
+        'version': version
+    }, 202)
+
+@app.route('/admin/models/<version>', methods=['DELETE'])
+@admin_required
+def unload_model_version(version):
+    # Unloading only frees memory on this instance; the sync would reload
+    # anything the fleet routing still points at
+    routing = get_model_routing()
+    if version in ((routing.get('active') or {}).get('version'), (routing.get('shadow') or {}).get('version')):
+        return error_response(f"Model {version} is in the fleet routing; replace it first", 400)
+
+    result = unload_model(version)
+
+    if result['success']:
+        del result['success']
+        return success_response(result, 200)
+    else:
+        return error_response(result.get('message', 'Unload failed'), 400)
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
     app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
@@ -1,4 +1,6 @@
 from functools import wraps
+import hmac
+import os
 from flask import request, jsonify
 from auth_service import verify_access_token
 
@@ -30,4 +32,26 @@ def token_required(f):
         kwargs['user_id'] = user_id
         return f(*args, **kwargs)
     
-    return decorated
\ No newline at end of file
+    return decorated
+
+def admin_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        # Admin routes are disabled unless an admin key is configured
+        admin_key = os.environ.get('ADMIN_API_KEY')
+        if not admin_key:
+            return jsonify({
+                'success': False,
+                'message': 'Admin API is not enabled'
+            }), 403
+
+        provided_key = request.headers.get('X-Admin-Key', '')
+        if not hmac.compare_digest(provided_key, admin_key):
+            return jsonify({
+                'success': False,
+                'message': 'Invalid admin key'
+            }), 401
+
+        return f(*args, **kwargs)
+
+    return decorated
@@ -0,0 +1,93 @@
+"""Benchmark response serialization: bytes and CPU time per full response
+
+Compares the old jsonify-based success_response with the current one from
+responses.py on typical /realtime-heart and /calories payloads. Both build a
+complete Flask Response inside a GET request context, so the new path pays
+for its ETag hash, Vary header and conditional check. A separate
+serialization-only section compares app.json.dumps with encode_envelope.
+
+Usage:
+    python bench_serialization.py [--iterations 20000]
+"""
+import argparse
+import time
+
+from flask import Flask, jsonify
+
+from responses import success_response
+from serializer import encode_envelope, compute_etag, msgpack_available, orjson, JSON_MIMETYPE, MSGPACK_MIMETYPE
+
+PAYLOADS = {
+    'realtime-heart': {
+        'userId': '3f2b8c1e-6a4d-4f0e-9b7a-1c2d3e4f5a6b',
+        'bpm': 78,
+        'spo2': 97,
+        'warning': 0
+    },
+    'calories': {
+        'bpm': 112,
+        'calories_per_minute': 6.12,
+        'total_calories_today': 412.58,
+        'total_minutes_tracked': 67,
+        'active_calories_per_hour': 367.2,
+        'bmr_calories_per_day': 1712.44,
+        'estimated_daily_calories': 2079.64
+    }
+}
+
+def old_success_response(data, status_code=200):
+    # success_response as it was before the serializer fast path
+    return jsonify({
+        'statusCode': status_code,
+        'data': data
+    }), status_code
+
+def bench(fn, iterations):
+    """Return (body size in bytes, CPU microseconds per call)"""
+    body = fn()
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return len(body), (time.process_time() - start) / iterations * 1e6
+
+def print_row(payload, method, size, cpu_us):
+    print(f"{payload:<16}{method:<30}{size:>8}{cpu_us:>10.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark response serialization')
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    print(f"JSON encoder: {'orjson' if orjson is not None else 'stdlib json'}")
+
+    print("\nFull responses (Response object, headers, ETag/conditional where applicable)")
+    print(f"{'payload':<16}{'method':<30}{'bytes':>8}{'cpu us':>10}")
+    for name, data in PAYLOADS.items():
+        # Baseline: what Flask did with the old (jsonify, status) tuple
+        with app.test_request_context(method='GET'):
+            print_row(name, 'old jsonify', *bench(lambda: app.make_response(old_success_response(data)).get_data(), args.iterations))
+
+        with app.test_request_context(method='GET'):
+            print_row(name, 'success_response json', *bench(lambda: success_response(data).get_data(), args.iterations))
+
+        if msgpack_available():
+            with app.test_request_context(method='GET', headers={'Accept': MSGPACK_MIMETYPE}):
+                print_row(name, 'success_response msgpack', *bench(lambda: success_response(data).get_data(), args.iterations))
+
+        # Unchanged reading: the client sends back the ETag and gets an empty 304
+        etag = compute_etag(encode_envelope('data', data, 200, JSON_MIMETYPE))
+        with app.test_request_context(method='GET', headers={'If-None-Match': f'"{etag}"'}):
+            print_row(name, 'success_response 304', *bench(lambda: success_response(data).get_data(), args.iterations))
+
+    print("\nSerialization only (envelope to bytes, no Response)")
+    print(f"{'payload':<16}{'method':<30}{'bytes':>8}{'cpu us':>10}")
+    for name, data in PAYLOADS.items():
+        with app.app_context():
+            print_row(name, 'app.json.dumps', *bench(lambda: app.json.dumps({'statusCode': 200, 'data': data}).encode('utf-8'), args.iterations))
+        print_row(name, 'encode_envelope json', *bench(lambda: encode_envelope('data', data, 200, JSON_MIMETYPE), args.iterations))
+        if msgpack_available():
+            print_row(name, 'encode_envelope msgpack', *bench(lambda: encode_envelope('data', data, 200, MSGPACK_MIMETYPE), args.iterations))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""Build a reduced-precision TFLite variant of the heart disease model
+
+Converts heart_disease_model.h5 to TFLite (float16 or dynamic-range int8)
+and writes a report comparing the variant with the
+Keras model on a fixed evaluation set: prediction agreement, per-call
+latency and peak RSS. The variant is measured with the standalone LiteRT
+interpreter in a process that never imports TensorFlow, matching how
+model_service serves it.
+
+Usage:
+    python convert_model.py --quantization float16
+    python convert_model.py --quantization dynamic --eval-csv eval.csv
+
+Full-integer int8 isn't offered: the model takes raw, unnormalized features
+and int8 inputs share one scale, so with height up to ~195 the 0/1 features
+(gender, smoke, alco) would collapse onto the same quantized value.
+"""
+import argparse
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+import numpy as np
+
+FEATURE_COLUMNS = ['age', 'gender', 'height', 'weight', 'bpm', 'smoke', 'alco']
+EVAL_SEED = 2024
+EVAL_SIZE = 500
+
+def generate_profiles(size, seed):
+    """Generate a deterministic set of user profiles in realistic ranges"""
+    rng = np.random.default_rng(seed)
+    profiles = []
+    for _ in range(size):
+        profiles.append({
+            'age': int(rng.integers(18, 81)),
+            'gender': int(rng.integers(0, 2)),
+            'height': int(rng.integers(150, 196)),
+            'weight': int(rng.integers(45, 121)),
+            'bpm': int(rng.integers(45, 161)),
+            'smoke': int(rng.random() < 0.2),
+            'alco': int(rng.random() < 0.15)
+        })
+    return profiles
+
+def load_profiles(eval_csv=None):
+    """Load the evaluation set from a CSV with FEATURE_COLUMNS, or the fixed default set"""
+    if not eval_csv:
+        return generate_profiles(EVAL_SIZE, EVAL_SEED)
+
+    with open(eval_csv, newline='') as f:
+        return [{k: float(row[k]) for k in FEATURE_COLUMNS} for row in csv.DictReader(f)]
+
+def convert(model_path, output_path, quantization):
+    """Convert a Keras model to TFLite with the requested quantization"""
+    import tensorflow as tf
+
+    keras_model = tf.keras.models.load_model(model_path, compile=False)
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    # 'dynamic' keeps the default: int8 weights with float inputs and activations
+
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+
+def measure(model_path, eval_csv=None):
+    """Run the evaluation set through one model and collect predictions, latency and RSS
+
+    Runs in its own process (see measure_in_subprocess) so RSS only reflects
+    the runtime and model under test. model_service only imports TensorFlow
+    for Keras models, so a .tflite measurement never loads it.
+    """
+    from model_service import load_model_file, build_features, run_model
+
+    profiles = load_profiles(eval_csv)
+    load_start = time.perf_counter()
+    loaded_model = load_model_file(model_path)
+    load_ms = (time.perf_counter() - load_start) * 1000
+
+    # Warm up so graph tracing isn't counted as per-call latency
+    run_model(loaded_model, build_features(profiles[0]))
+
+    predictions = []
+    latencies = []
+    for profile in profiles:
+        X = build_features(profile)
+        start = time.perf_counter()
+        predictions.append(run_model(loaded_model, X))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'model': model_path,
+        'model_size_bytes': os.path.getsize(model_path),
+        'load_ms': round(load_ms, 2),
+        'predictions': predictions,
+        'latency_ms': {
+            'mean': round(float(np.mean(latencies)), 4),
+            'p50': round(float(np.percentile(latencies, 50)), 4),
+            'p95': round(float(np.percentile(latencies, 95)), 4),
+            'p99': round(float(np.percentile(latencies, 99)), 4)
+        },
+        # ru_maxrss is reported in kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'tensorflow_loaded': 'tensorflow' in sys.modules
+    }
+
+def measure_in_subprocess(model_path, eval_csv=None):
+    command = [sys.executable, __file__, '--measure', model_path]
+    if eval_csv:
+        command += ['--eval-csv', eval_csv]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    # The measurement JSON is the last line; anything before it is TF logging
+    return json.loads(output.strip().splitlines()[-1])
+
+def build_report(baseline, variant, quantization):
+    baseline_predictions = baseline.pop('predictions')
+    variant_predictions = variant.pop('predictions')
+    agreements = sum(1 for a, b in zip(baseline_predictions, variant_predictions) if a == b)
+
+    return {
+        'quantization': quantization,
+        'eval_size': len(baseline_predictions),
+        'agreement_rate': round(agreements / len(baseline_predictions), 4),
+        'disagreements': len(baseline_predictions) - agreements,
+        'baseline': baseline,
+        'variant': variant,
+        'latency_speedup': round(baseline['latency_ms']['mean'] / variant['latency_ms']['mean'], 2),
+        'rss_saved_mb': round(baseline['peak_rss_mb'] - variant['peak_rss_mb'], 1),
+        'size_ratio': round(variant['model_size_bytes'] / baseline['model_size_bytes'], 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a reduced-precision TFLite model and report')
+    parser.add_argument('--model', default='heart_disease_model.h5')
+    parser.add_argument('--quantization', choices=['float16', 'dynamic'], default='float16')
+    parser.add_argument('--output', help='Defaults to heart_disease_model_<quantization>.tflite')
+    parser.add_argument('--report', default='model_report.json')
+    parser.add_argument('--eval-csv', help=f"CSV with columns {', '.join(FEATURE_COLUMNS)}")
+    parser.add_argument('--measure', metavar='MODEL_PATH', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        result = measure(args.measure, args.eval_csv)
+        if args.measure.endswith('.tflite') and result['tensorflow_loaded']:
+            sys.exit("TensorFlow was imported while measuring the TFLite model; RSS would not be comparable")
+        print(json.dumps(result))
+        return
+
+    output_path = args.output or f"{os.path.splitext(args.model)[0]}_{args.quantization}.tflite"
+    convert(args.model, output_path, args.quantization)
+
+    report = build_report(
+        measure_in_subprocess(args.model, args.eval_csv),
+        measure_in_subprocess(output_path, args.eval_csv),
+        args.quantization
+    )
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Wrote {output_path}")
+    print(f"Agreement {report['agreement_rate']:.2%}, "
+          f"latency {report['baseline']['latency_ms']['mean']}ms -> {report['variant']['latency_ms']['mean']}ms, "
+          f"peak RSS {report['baseline']['peak_rss_mb']}MB -> {report['variant']['peak_rss_mb']}MB")
+
+if __name__ == '__main__':
+    main()
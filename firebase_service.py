@@ -25,7 +25,8 @@ def update_calories_tracking(user_id, calories_per_minute, minutes):
         minutes: Number of minutes to add (typically 1)
     
     Returns:
-        dict with updated tracking information
+        dict with updated tracking information, or the current totals unchanged
+        if this wall-clock minute has already been credited
     """
     # Get today's date as string (YYYY-MM-DD)
     today = date.today().isoformat()
@@ -44,6 +45,16 @@ def update_calories_tracking(user_id, calories_per_minute, minutes):
             'total_minutes': 0
         }
     
+    # Credit each wall-clock minute at most once, so clients polling /calories
+    # faster than once a minute don't inflate the totals, while a device that
+    # polls roughly every minute (with jitter) still gets every minute counted
+    now = datetime.now()
+    last_updated = tracking_data.get('last_updated')
+    if last_updated:
+        last_minute = datetime.fromisoformat(last_updated).replace(second=0, microsecond=0)
+        if last_minute == now.replace(second=0, microsecond=0):
+            return tracking_data
+    
     # Update tracking data
     new_total_calories = tracking_data.get('total_calories', 0) + calories_per_minute
     new_total_minutes = tracking_data.get('total_minutes', 0) + minutes
@@ -53,8 +64,33 @@ def update_calories_tracking(user_id, calories_per_minute, minutes):
         'date': today,
         'total_calories': new_total_calories,
         'total_minutes': new_total_minutes,
-        'last_updated': datetime.now().isoformat()
+        'last_updated': now.isoformat()
     }
     ref.set(updated_data)
     
-    return updated_data
\ No newline at end of file
+    return updated_data
+
+def get_model_routing():
+    """Get the fleet-wide model routing written by the admin API
+
+    Returns:
+        dict with optional keys 'active' ({version, path}), 'shadow'
+        ({version, path, sample_rate}) and 'versions' ({version: {path}})
+    """
+    return db.reference('model_registry').get() or {}
+
+def register_model_version(version, path):
+    """Record where a model version lives so any instance can load it"""
+    db.reference(f'model_registry/versions/{version}').set({'path': path})
+
+def set_active_model_routing(version, path):
+    """Make a version the one every instance serves"""
+    db.reference('model_registry/active').set({'version': version, 'path': path})
+
+def set_shadow_model_routing(version, path=None, sample_rate=0.0):
+    """Shadow-score a version on every instance, or disable shadowing if version is None"""
+    ref = db.reference('model_registry/shadow')
+    if version is None:
+        ref.delete()
+    else:
+        ref.set({'version': version, 'path': path, 'sample_rate': sample_rate})
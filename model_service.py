@@ -1,34 +1,95 @@
-import tensorflow as tf  
-from tensorflow import keras
 import numpy as np
-import os  
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Set environment variable to reduce TensorFlow logging
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 
-# Initialize model as None for lazy loading
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = os.environ.get('MODEL_PATH', 'heart_disease_model.h5')
+DEFAULT_MODEL_VERSION = os.environ.get('MODEL_VERSION', 'default')
+
+def _sync_interval():
+    value = os.environ.get('MODEL_SYNC_INTERVAL', '30')
+    try:
+        interval = float(value)
+    except ValueError:
+        interval = 0
+    if not interval > 0:
+        logger.warning(f"Ignoring invalid MODEL_SYNC_INTERVAL={value!r}; using 30")
+        return 30.0
+    return interval
+
+# Profile used to warm a freshly loaded model before it serves traffic
+WARMUP_FEATURES = {
+    'age': 25,
+    'gender': 1,
+    'height': 170,
+    'weight': 65,
+    'bpm': 75,
+    'smoke': 0,
+    'alco': 0
+}
+
+# Model registry: version -> loaded model, plus which versions serve traffic.
+# Requests snapshot the routing under _registry_lock and predict outside it,
+# so a swap never interrupts a prediction that is already running.
+_models = {}
+_model_paths = {}
+_active_version = None
+_shadow_version = None
+_shadow_sample_rate = 0.0
+_registry_lock = threading.Lock()
+_init_lock = threading.Lock()
+
+# Outcome of the latest deploy per version: loading, ready or failed
+_deployments = {}
+
+# A version/path that failed to load is retried on the next sync after this long
+FAILED_DEPLOY_RETRY_SECONDS = 300
+
+# Fleet-wide routing lives in the database (see start_model_sync); every
+# instance polls it and converges, so a swap isn't limited to one instance
+_routing_fetcher = None
+
+# Predictions currently running or waiting on the TF thread, used for load shedding.
+# Shadow scoring counts too, and at most one shadow job is ever queued.
+_inflight = 0
+_shadow_pending = False
+_inflight_lock = threading.Lock()
+
+# Per-version serving stats and shadow-vs-active agreement stats
+_stats = {}
+_stats_lock = threading.Lock()
+
+# Background workers: model loading and shadow scoring never block requests
+_loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-loader')
+_shadow_scorer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-shadow')
+
+# Kept for backwards compatibility: always points at the active model
 model = None
 
-def load_model():
-    global model
-    if model is None:
-        # Configure memory usage
+# TensorFlow is only imported for Keras models; .tflite models run on the
+# standalone LiteRT interpreter so serving them never loads the TF runtime
+def _configure_tf():
+    import tensorflow as tf
+
+    # Configure memory usage
+    try:
         tf.config.threading.set_intra_op_parallelism_threads(1)
         tf.config.threading.set_inter_op_parallelism_threads(1)
-        
-        # Load model only when needed
-        model = tf.keras.models.load_model('heart_disease_model.h5', compile=False)
-    return model
+    except RuntimeError:
+        # Thread pools are fixed once TF has initialized, e.g. on a hot reload
+        pass
 
-# Predict
-def predict_warning(features):
-    # Get model (lazy loading)
-    global model
-    if model is None:
-        model = load_model()
-        
+def build_features(features):
     bpm = features.get('bpm', 0)
-    X = np.array([[
+    return np.array([[
         features['age'],
         features['gender'],
         features['height'],
@@ -38,12 +99,420 @@ def predict_warning(features):
         features['smoke'],
         features['alco'],
     ]])
-    
+
+def _lite_interpreter_class():
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            raise ImportError("Serving .tflite models requires ai-edge-litert or tflite-runtime")
+    return Interpreter
+
+class _TFLiteModel:
+    """Serves a .tflite model through the same predict() call as Keras"""
+
+    def __init__(self, path):
+        self.interpreter = _lite_interpreter_class()(model_path=path, num_threads=1)
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+        # The interpreter holds tensor buffers, so it can't be shared across threads
+        self.lock = threading.Lock()
+
+    def predict(self, X, batch_size=1, verbose=0):
+        X = np.asarray(X, dtype=np.float32)
+
+        # Full-integer models take quantized input
+        input_dtype = self.input_details['dtype']
+        if input_dtype in (np.int8, np.uint8):
+            scale, zero_point = self.input_details['quantization']
+            info = np.iinfo(input_dtype)
+            X = np.clip(np.round(X / scale + zero_point), info.min, info.max)
+        X = X.astype(input_dtype)
+
+        outputs = []
+        with self.lock:
+            for row in X:
+                self.interpreter.set_tensor(self.input_details['index'], row[np.newaxis, :])
+                self.interpreter.invoke()
+                outputs.append(self.interpreter.get_tensor(self.output_details['index'])[0])
+        prediction = np.array(outputs)
+
+        output_dtype = self.output_details['dtype']
+        if output_dtype in (np.int8, np.uint8):
+            scale, zero_point = self.output_details['quantization']
+            prediction = (prediction.astype(np.float32) - zero_point) * scale
+        return prediction
+
+def load_model_file(path):
+    """Load a Keras (.h5/.keras) or TFLite (.tflite) model from disk"""
+    if path.endswith('.tflite'):
+        return _TFLiteModel(path)
+
+    import tensorflow as tf
+    _configure_tf()
+    return tf.keras.models.load_model(path, compile=False)
+
+def run_model(loaded_model, X):
+    """Run a loaded model on a feature array and return the warning class"""
     # Predict with smaller batch size to reduce memory usage
-    prediction = model.predict(X, batch_size=1)
-    
-    # Return prediction
+    prediction = loaded_model.predict(X, batch_size=1, verbose=0)
+
     if prediction.shape[1] == 1:
         return int(prediction[0][0] > 0.5)
     else:
-        return int(np.argmax(prediction[0]))
\ No newline at end of file
+        return int(np.argmax(prediction[0]))
+
+def _new_stats():
+    return {
+        'predictions': 0,
+        'errors': 0,
+        'total_latency_ms': 0.0,
+        'max_latency_ms': 0.0,
+        'shadow_predictions': 0,
+        'shadow_agreements': 0,
+        'shadow_skipped': 0
+    }
+
+def _record_latency(version, latency_ms, error=False):
+    with _stats_lock:
+        stats = _stats.setdefault(version, _new_stats())
+        if error:
+            stats['errors'] += 1
+            return
+        stats['predictions'] += 1
+        stats['total_latency_ms'] += latency_ms
+        stats['max_latency_ms'] = max(stats['max_latency_ms'], latency_ms)
+
+def _timed_predict(version, loaded_model, X):
+    start = time.perf_counter()
+    try:
+        result = run_model(loaded_model, X)
+    except Exception:
+        _record_latency(version, 0.0, error=True)
+        raise
+    _record_latency(version, (time.perf_counter() - start) * 1000)
+    return result
+
+def _shadow_score(version, loaded_model, X, active_result):
+    global _inflight, _shadow_pending
+    try:
+        shadow_result = _timed_predict(version, loaded_model, X)
+    except Exception:
+        return
+    finally:
+        with _inflight_lock:
+            _inflight -= 1
+            _shadow_pending = False
+    with _stats_lock:
+        stats = _stats.setdefault(version, _new_stats())
+        stats['shadow_predictions'] += 1
+        if shadow_result == active_result:
+            stats['shadow_agreements'] += 1
+
+def load_model_version(version, path):
+    """Load a model version, warm it with a test prediction and register it
+
+    Args:
+        version: Name the model is registered under
+        path: Path to a .h5 or .tflite model file
+
+    Returns:
+        dict with success flag and message
+    """
+    try:
+        loaded_model = load_model_file(path)
+
+        # Warm up so the first real request doesn't pay for graph tracing
+        run_model(loaded_model, build_features(WARMUP_FEATURES))
+    except Exception as e:
+        return {"success": False, "message": f"Failed to load model {version}: {str(e)}"}
+
+    global model
+    with _registry_lock:
+        _models[version] = loaded_model
+        _model_paths[version] = path
+        if version == _active_version:
+            model = loaded_model
+    with _stats_lock:
+        _stats[version] = _new_stats()
+
+    return {"success": True, "message": f"Model {version} loaded", "version": version}
+
+def activate_model(version):
+    """Atomically switch serving traffic to an already loaded version"""
+    global model, _active_version, _shadow_version
+    with _registry_lock:
+        if version not in _models:
+            return {"success": False, "message": f"Model {version} is not loaded"}
+        model = _models[version]
+        _active_version = version
+
+        # A version can't shadow itself
+        if _shadow_version == version:
+            _shadow_version = None
+
+    return {"success": True, "message": f"Model {version} is now active", "version": version}
+
+def parse_sample_rate(value):
+    """Return value as a float in [0, 1], or None if it isn't one"""
+    if isinstance(value, bool):
+        return None
+    try:
+        sample_rate = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not 0.0 <= sample_rate <= 1.0:
+        return None
+    return sample_rate
+
+def set_shadow_model(version, sample_rate):
+    """Shadow-score a loaded version on a sampled share of traffic
+
+    Args:
+        version: Loaded version to score, or None to disable shadowing
+        sample_rate: Share of requests (0.0 - 1.0) also sent to the shadow model
+    """
+    global _shadow_version, _shadow_sample_rate
+    sample_rate = parse_sample_rate(sample_rate)
+    if sample_rate is None:
+        return {"success": False, "message": "sample_rate must be a number between 0 and 1"}
+
+    with _registry_lock:
+        if version is not None:
+            if version not in _models:
+                return {"success": False, "message": f"Model {version} is not loaded"}
+            if version == _active_version:
+                return {"success": False, "message": "Active model cannot be its own shadow"}
+        _shadow_version = version
+        _shadow_sample_rate = sample_rate
+
+    return {"success": True, "message": "Shadow model updated", "version": version}
+
+def unload_model(version):
+    """Drop an inactive version from the registry to free memory"""
+    global _shadow_version
+    with _registry_lock:
+        if version == _active_version:
+            return {"success": False, "message": "Cannot unload the active model"}
+        if version not in _models:
+            return {"success": False, "message": f"Model {version} is not loaded"}
+        del _models[version]
+        del _model_paths[version]
+        if _shadow_version == version:
+            _shadow_version = None
+
+    return {"success": True, "message": f"Model {version} unloaded", "version": version}
+
+def deploy_model(version, path, activate=True, shadow_sample_rate=None):
+    """Load a model version and then activate or shadow it
+
+    Loading and warm-up run in the caller's thread, so use
+    deploy_model_async from request handlers.
+    """
+    result = load_model_version(version, path)
+    if result['success']:
+        if activate:
+            result = activate_model(version)
+        elif shadow_sample_rate is not None:
+            result = set_shadow_model(version, shadow_sample_rate)
+
+    _record_deployment(version, path, 'ready' if result['success'] else 'failed', result['message'])
+    if not result['success']:
+        logger.warning(result['message'])
+    return result
+
+def deploy_model_async(version, path, activate=True, shadow_sample_rate=None):
+    """Run deploy_model on the background loader thread
+
+    Progress and failures show up under 'deployments' in get_model_registry_status.
+    """
+    _record_deployment(version, path, 'loading', f"Loading model {version}")
+    return _loader.submit(deploy_model, version, path, activate, shadow_sample_rate)
+
+def _record_deployment(version, path, state, message):
+    with _registry_lock:
+        _deployments[version] = {
+            'path': path,
+            'state': state,
+            'message': message,
+            'updated_at': time.time()
+        }
+
+def _deploy_failed(version, path):
+    # Back off after a failed load instead of retrying it on every sync
+    deployment = _deployments.get(version)
+    return (deployment is not None and deployment['path'] == path and deployment['state'] == 'failed'
+            and time.time() - deployment['updated_at'] < FAILED_DEPLOY_RETRY_SECONDS)
+
+def sync_model_routing(routing):
+    """Converge this instance on the fleet-wide routing
+
+    Loads and activates or shadows whatever the routing asks for, and does
+    nothing once this instance already matches it. A version/path that
+    failed to load is retried after FAILED_DEPLOY_RETRY_SECONDS.
+
+    Args:
+        routing: dict from firebase_service.get_model_routing
+    """
+    routing = routing or {}
+
+    active = routing.get('active')
+    if active:
+        version, path = active.get('version'), active.get('path')
+        if version and path and not (_active_version == version and _model_paths.get(version) == path):
+            if _model_paths.get(version) == path:
+                result = activate_model(version)
+                if not result['success']:
+                    logger.warning(result['message'])
+            elif not _deploy_failed(version, path):
+                deploy_model(version, path)
+
+    shadow = routing.get('shadow')
+    if shadow:
+        version, path = shadow.get('version'), shadow.get('path')
+        sample_rate = shadow.get('sample_rate', 0.0)
+        if not version or not path:
+            return
+        if _model_paths.get(version) != path:
+            if not _deploy_failed(version, path):
+                deploy_model(version, path, activate=False, shadow_sample_rate=sample_rate)
+        elif _shadow_version != version or _shadow_sample_rate != sample_rate:
+            result = set_shadow_model(version, sample_rate)
+            if not result['success']:
+                logger.warning(result['message'])
+    elif _shadow_version is not None:
+        set_shadow_model(None, 0.0)
+
+def apply_model_routing_async(routing):
+    """Run sync_model_routing on the background loader thread"""
+    return _loader.submit(sync_model_routing, routing)
+
+def start_model_sync(fetch_routing):
+    """Poll the fleet-wide routing every MODEL_SYNC_INTERVAL seconds and converge on it
+
+    Args:
+        fetch_routing: Callable returning the routing dict, e.g.
+            firebase_service.get_model_routing
+    """
+    global _routing_fetcher
+    _routing_fetcher = fetch_routing
+    interval = _sync_interval()
+
+    def poll():
+        while True:
+            try:
+                apply_model_routing_async(fetch_routing())
+            except Exception as e:
+                logger.warning(f"Model routing sync failed: {str(e)}")
+            time.sleep(interval)
+
+    threading.Thread(target=poll, name='model-sync', daemon=True).start()
+
+def _startup_model():
+    # New instances start on the fleet's active version, not MODEL_PATH
+    if _routing_fetcher is not None:
+        try:
+            active = (_routing_fetcher() or {}).get('active') or {}
+            if active.get('version') and active.get('path'):
+                return active['version'], active['path']
+        except Exception as e:
+            logger.warning(f"Could not read model routing, using {DEFAULT_MODEL_PATH}: {str(e)}")
+    return DEFAULT_MODEL_VERSION, DEFAULT_MODEL_PATH
+
+def get_model_registry_status():
+    """Get loaded versions, traffic routing and per-version stats"""
+    with _registry_lock:
+        versions = {version: {'path': path} for version, path in _model_paths.items()}
+        active_version = _active_version
+        shadow_version = _shadow_version
+        shadow_sample_rate = _shadow_sample_rate
+        deployments = {version: dict(info) for version, info in _deployments.items()}
+
+    with _stats_lock:
+        for version, info in versions.items():
+            stats = dict(_stats.get(version, _new_stats()))
+            predictions = stats['predictions']
+            shadow_predictions = stats['shadow_predictions']
+            stats['avg_latency_ms'] = round(stats['total_latency_ms'] / predictions, 3) if predictions else None
+            stats['agreement_rate'] = round(stats['shadow_agreements'] / shadow_predictions, 4) if shadow_predictions else None
+            info.update(stats)
+
+    return {
+        'active_version': active_version,
+        'shadow_version': shadow_version,
+        'shadow_sample_rate': shadow_sample_rate,
+        'versions': versions,
+        'deployments': deployments
+    }
+
+def _submit_shadow(version, loaded_model, X, active_result):
+    global _inflight, _shadow_pending
+    with _inflight_lock:
+        # Drop the sample rather than queue behind a slow shadow model
+        skip = _shadow_pending
+        if not skip:
+            _shadow_pending = True
+            _inflight += 1
+
+    if skip:
+        with _stats_lock:
+            _stats.setdefault(version, _new_stats())['shadow_skipped'] += 1
+        return
+    _shadow_scorer.submit(_shadow_score, version, loaded_model, X, active_result)
+
+def get_inference_queue_depth():
+    """Number of predictions currently in flight, including shadow scoring"""
+    return _inflight
+
+def load_model():
+    global model, _active_version
+    if _active_version is None:
+        # Load model only when needed
+        with _init_lock:
+            if _active_version is None:
+                version, path = _startup_model()
+                result = load_model_version(version, path)
+                _record_deployment(version, path, 'ready' if result['success'] else 'failed', result['message'])
+                if not result['success']:
+                    raise RuntimeError(result['message'])
+
+                # An admin deploy may have activated another version while this
+                # one was loading; the default must not replace it
+                with _registry_lock:
+                    if _active_version is None:
+                        model = _models[version]
+                        _active_version = version
+    return model
+
+# Predict
+def predict_warning(features):
+    global _inflight
+
+    # Get model (lazy loading)
+    if _active_version is None:
+        load_model()
+
+    # Snapshot routing so a concurrent swap can't mix versions mid-request
+    with _registry_lock:
+        active_version = _active_version
+        active_model = _models[active_version]
+        shadow_version = _shadow_version
+        shadow_model = _models.get(shadow_version) if shadow_version else None
+        shadow_sample_rate = _shadow_sample_rate
+
+    X = build_features(features)
+    with _inflight_lock:
+        _inflight += 1
+    try:
+        result = _timed_predict(active_version, active_model, X)
+    finally:
+        with _inflight_lock:
+            _inflight -= 1
+
+    if shadow_model is not None and random.random() < shadow_sample_rate:
+        _submit_shadow(shadow_version, shadow_model, X, result)
+
+    return result
@@ -0,0 +1,195 @@
+from collections import OrderedDict
+from functools import wraps
+from flask import request
+from model_service import get_inference_queue_depth
+from responses import error_response
+import logging
+import math
+import os
+import threading
+import time
+
+# Default limits per route: (tokens refilled per second, bucket size)
+# Override with RATE_LIMIT_<ROUTE>="<rate>/<burst>", e.g. RATE_LIMIT_CALORIES="0.1/2"
+DEFAULT_ROUTE_LIMITS = {
+    'realtime-heart': (1.0, 5),
+    'public-heart-data': (0.5, 5),
+    'calories': (0.2, 3),
+    # Shared by every inference route to protect the single TF thread
+    'global-inference': (20.0, 40)
+}
+
+GLOBAL_KEY = '*'
+
+logger = logging.getLogger(__name__)
+
+def _env_number(name, default, cast, minimum):
+    value = os.environ.get(name)
+    if not value:
+        return default
+
+    try:
+        number = cast(value)
+    except ValueError:
+        number = None
+    if number is None or not math.isfinite(number) or number < minimum:
+        logger.warning(f"Ignoring invalid {name}={value!r}, expected a number >= {minimum}; using {default}")
+        return default
+    return number
+
+# Reject inference requests outright once this many predictions are in flight
+MAX_INFERENCE_QUEUE = _env_number('MAX_INFERENCE_QUEUE', 8, int, 1)
+
+# Buckets idle this long are dropped; they'd have refilled to full anyway
+IDLE_TTL_SECONDS = _env_number('RATE_LIMIT_IDLE_TTL', 300.0, float, 0)
+# Hard cap on tracked keys per route; least recently seen keys go first
+MAX_KEYS_PER_ROUTE = _env_number('RATE_LIMIT_MAX_KEYS', 100000, int, 1)
+
+# route -> OrderedDict(key -> [tokens, last_seen]), ordered by last_seen
+_buckets = {}
+# (route, outcome) -> count; outcomes: allowed, rate_limited, global_limited, shed
+_counters = {}
+_lock = threading.Lock()
+
+def _parse_limit(route, default):
+    name = 'RATE_LIMIT_' + route.upper().replace('-', '_')
+    value = os.environ.get(name)
+    if not value:
+        return default
+
+    try:
+        rate, burst = value.split('/')
+        rate, burst = float(rate), int(burst)
+    except ValueError:
+        rate, burst = 0, 0
+    # A zero rate would never refill and a bucket smaller than 1 never allows a request
+    if not (rate > 0 and math.isfinite(rate) and burst >= 1):
+        logger.warning(f"Ignoring invalid {name}={value!r}, expected '<rate>/<burst>' "
+                       f"with rate > 0 and burst >= 1; using {default[0]}/{default[1]}")
+        return default
+    return rate, burst
+
+ROUTE_LIMITS = {route: _parse_limit(route, limit) for route, limit in DEFAULT_ROUTE_LIMITS.items()}
+
+def _evict_idle(buckets, now, idle_ttl):
+    # Buckets are ordered by last access, so idle ones are always at the front
+    while buckets:
+        key, bucket = next(iter(buckets.items()))
+        if now - bucket[1] < idle_ttl and len(buckets) <= MAX_KEYS_PER_ROUTE:
+            break
+        buckets.popitem(last=False)
+
+def _refill(route, key, now):
+    """Return the up-to-date bucket for a key, creating it full if it's new"""
+    rate, burst = ROUTE_LIMITS[route]
+    buckets = _buckets.setdefault(route, OrderedDict())
+
+    bucket = buckets.get(key)
+    if bucket is None:
+        bucket = [float(burst), now]
+        buckets[key] = bucket
+    else:
+        bucket[0] = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        buckets.move_to_end(key)
+
+    # Never evict before a bucket could have refilled, or limits would reset early
+    _evict_idle(buckets, now, max(IDLE_TTL_SECONDS, burst / rate))
+    return bucket
+
+def _retry_after(route, bucket):
+    rate = ROUTE_LIMITS[route][0]
+    return (1 - bucket[0]) / rate
+
+def _count(route, outcome):
+    _counters[(route, outcome)] = _counters.get((route, outcome), 0) + 1
+
+def check_rate_limit(route, key, inference=False):
+    """Check whether a request may proceed
+
+    Args:
+        route: Route name in ROUTE_LIMITS
+        key: Client key, the user_id or the client IP
+        inference: Also apply the global inference bucket and queue-depth shedding
+
+    Returns:
+        (allowed, outcome, retry_after_seconds)
+    """
+    now = time.monotonic()
+    with _lock:
+        if inference and get_inference_queue_depth() >= MAX_INFERENCE_QUEUE:
+            _count(route, 'shed')
+            return False, 'shed', 1
+
+        # Check every bucket before spending from any, so a request rejected
+        # by the global limit doesn't also drain the caller's own bucket
+        bucket = _refill(route, key, now)
+        if bucket[0] < 1:
+            _count(route, 'rate_limited')
+            return False, 'rate_limited', _retry_after(route, bucket)
+
+        global_bucket = None
+        if inference:
+            global_bucket = _refill('global-inference', GLOBAL_KEY, now)
+            if global_bucket[0] < 1:
+                _count(route, 'global_limited')
+                return False, 'global_limited', _retry_after('global-inference', global_bucket)
+
+        bucket[0] -= 1
+        if global_bucket is not None:
+            global_bucket[0] -= 1
+        _count(route, 'allowed')
+        return True, 'allowed', 0
+
+def rate_limited(route, inference=False):
+    """Token-bucket limit a route per user_id (after token_required) or per client IP
+
+    Must be applied below @token_required so the user_id kwarg is available.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            key = kwargs.get('user_id') or request.remote_addr
+            allowed, outcome, retry_after = check_rate_limit(route, key, inference)
+
+            if not allowed:
+                if outcome == 'shed':
+                    status_code, message = 503, 'Server is busy, please retry shortly'
+                else:
+                    status_code, message = 429, 'Too many requests'
+                response = error_response(message, status_code)
+                response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+                return response
+
+            return f(*args, **kwargs)
+
+        return decorated
+
+    return decorator
+
+def render_metrics():
+    """Render rate limiter counters and gauges in Prometheus text format"""
+    with _lock:
+        counters = sorted(_counters.items())
+        active_keys = {route: len(buckets) for route, buckets in _buckets.items()}
+
+    lines = [
+        '# HELP rate_limit_requests_total Requests seen by the rate limiter by outcome',
+        '# TYPE rate_limit_requests_total counter'
+    ]
+    for (route, outcome), count in counters:
+        lines.append(f'rate_limit_requests_total{{route="{route}",outcome="{outcome}"}} {count}')
+
+    lines += [
+        '# HELP rate_limit_active_keys Clients currently tracked per route',
+        '# TYPE rate_limit_active_keys gauge'
+    ]
+    for route, count in sorted(active_keys.items()):
+        lines.append(f'rate_limit_active_keys{{route="{route}"}} {count}')
+
+    lines += [
+        '# HELP inference_queue_depth Predictions currently in flight',
+        '# TYPE inference_queue_depth gauge',
+        f'inference_queue_depth {get_inference_queue_depth()}'
+    ]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,24 @@
+from flask import Response, request
+from serializer import encode_envelope, compute_etag, negotiate_mimetype
+
+# Hàm tiện ích để chuẩn hóa response
+def success_response(data, status_code=200):
+    mimetype = negotiate_mimetype(request)
+    body = encode_envelope('data', data, status_code, mimetype)
+    response = Response(body, status=status_code, mimetype=mimetype)
+    response.vary.add('Accept')
+
+    # Polling clients send If-None-Match and get a 304 when nothing changed
+    if request.method == 'GET' and status_code == 200:
+        response.set_etag(compute_etag(body))
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response = response.make_conditional(request)
+
+    return response
+
+def error_response(error_message, status_code=400):
+    mimetype = negotiate_mimetype(request)
+    body = encode_envelope('errorString', error_message, status_code, mimetype)
+    response = Response(body, status=status_code, mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
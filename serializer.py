@@ -0,0 +1,84 @@
+import hashlib
+import json
+
+# orjson is several times faster than the stdlib encoder; fall back if it's missing
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+# Envelope fragments are built once per status code and reused for every response
+_json_envelopes = {}
+_msgpack_envelopes = {}
+
+def _dumps_json(obj):
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # e.g. integers wider than 64 bits; let the stdlib handle them
+            pass
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def _json_envelope(key, status_code):
+    envelope = _json_envelopes.get((key, status_code))
+    if envelope is None:
+        envelope = (f'{{"statusCode":{status_code},"{key}":'.encode('utf-8'), b'}')
+        _json_envelopes[(key, status_code)] = envelope
+    return envelope
+
+def _msgpack_envelope(key, status_code):
+    envelope = _msgpack_envelopes.get((key, status_code))
+    if envelope is None:
+        # 0x82 is a two-entry fixmap header
+        envelope = b'\x82' + msgpack.packb('statusCode') + msgpack.packb(status_code) + msgpack.packb(key)
+        _msgpack_envelopes[(key, status_code)] = envelope
+    return envelope
+
+def encode_envelope(key, value, status_code, mimetype=JSON_MIMETYPE):
+    """Serialize {'statusCode': status_code, key: value} in the given format
+
+    Args:
+        key: 'data' for success responses, 'errorString' for errors
+        value: Payload placed under key
+        status_code: HTTP status code echoed in the envelope
+        mimetype: JSON_MIMETYPE or MSGPACK_MIMETYPE
+
+    Returns:
+        Serialized body as bytes
+    """
+    if mimetype == MSGPACK_MIMETYPE:
+        return _msgpack_envelope(key, status_code) + msgpack.packb(value)
+
+    prefix, suffix = _json_envelope(key, status_code)
+    return prefix + _dumps_json(value) + suffix
+
+def negotiate_mimetype(request):
+    """Pick the response format for a Flask request
+
+    MessagePack is opt-in for device clients: ?format=msgpack or Accept header.
+    Only Accept needs to go in Vary; the query string is already part of the
+    URL, so caches key ?format=msgpack separately on their own.
+    """
+    if msgpack is None:
+        return JSON_MIMETYPE
+    if request.args.get('format') == 'msgpack':
+        return MSGPACK_MIMETYPE
+    if request.accept_mimetypes.best_match([JSON_MIMETYPE, MSGPACK_MIMETYPE]) == MSGPACK_MIMETYPE:
+        return MSGPACK_MIMETYPE
+    return JSON_MIMETYPE
+
+def compute_etag(body):
+    """Cheap content hash used as a strong ETag for a serialized body"""
+    return hashlib.blake2b(body, digest_size=12).hexdigest()
+
+def msgpack_available():
+    return msgpack is not None